@@ -20,16 +20,29 @@ Example:
 import re
 import ast
 import json
+import decimal
 import ipaddress
+import numpy as np
 import pandas as pd
 import argparse
 from typing import Optional
 
+from hosterbenchmark.feeds.parsers import read_csv_arrow
+
 try:
     import yaml
+    # libyaml-backed loader when PyYAML was built with it
+    _YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 except ImportError:
     yaml = None
 
+try:
+    import orjson  # optional; faster parsing of the JSON 'cidrs' cells
+except ImportError:
+    orjson = None
+
+_json_loads = orjson.loads if orjson is not None else json.loads
+
 CIDR_RE_V4 = re.compile(r"\b(?:\d{1,3}\.){3}\d{1,3}/\d{1,2}\b")
 CIDR_RE_V6 = re.compile(r"\b[0-9A-Fa-f:]+/\d{1,3}\b")
 
@@ -39,14 +52,23 @@ def safe_parse_ranges(s: str, include_ipv6: bool = False):
         return []
 
     s = s.strip().replace('""', '"')
-    try:
-        v = ast.literal_eval(s)
-        if isinstance(v, (list, tuple)):
-            cand = [str(x).strip().strip('"').strip("'") for x in v]
-        else:
-            cand = None
-    except Exception:
-        cand = None
+    cand = None
+    # Step 3 writes a JSON array: parse that directly, literal_eval only
+    # for Python-style lists
+    if s.startswith("["):
+        try:
+            v = _json_loads(s)
+            if isinstance(v, list):
+                cand = [str(x).strip().strip('"').strip("'") for x in v]
+        except Exception:
+            pass
+    if cand is None:
+        try:
+            v = ast.literal_eval(s)
+            if isinstance(v, (list, tuple)):
+                cand = [str(x).strip().strip('"').strip("'") for x in v]
+        except Exception:
+            pass
 
     if cand is None:
         cand = CIDR_RE_V4.findall(s)
@@ -80,8 +102,15 @@ def cidr_count_addrs(cidrs, include_ipv6=False):
             pass
     return len(cidrs), total
 
+def _read_orgs_csv(path: str) -> pd.DataFrame:
+    """Read the Step 3 table; Arrow-backed columns when pyarrow is installed."""
+    table = read_csv_arrow(path, sep="|")
+    if table is not None:
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    return pd.read_csv(path, sep="|")
+
 def compute_capacity_from_args(input_csv: str, output_csv: str, include_ipv6: bool = False):
-    df = pd.read_csv(input_csv, sep="|")
+    df = _read_orgs_csv(input_csv)
 
     # Ensure needed columns
     required = {"Organization", "domaincount"}
@@ -97,17 +126,20 @@ def compute_capacity_from_args(input_csv: str, output_csv: str, include_ipv6: bo
     if not range_field:
         raise ValueError("Input must contain a CIDR field like 'cidrs', 'ranges', or 'prefixes'")
 
-    df["domaincount"] = pd.to_numeric(df["domaincount"], errors="coerce").fillna(0).astype(int)
-
-    df["_cidr_list"] = df[range_field].apply(lambda s: safe_parse_ranges(s, include_ipv6))
-    stats = df["_cidr_list"].apply(lambda lst: cidr_count_addrs(lst, include_ipv6))
-    df["cidr_count"] = stats.apply(lambda x: x[0])
-    df["total_ips"] = stats.apply(lambda x: x[1])
-    df["avg_domains_per_ip"] = df.apply(
-        lambda r: (r["domaincount"] / r["total_ips"]) if r["total_ips"] > 0 else 0.0,
-        axis=1
-    )
-    df["cidrs"] = df["_cidr_list"].apply(lambda lst: json.dumps(lst, ensure_ascii=False))
+    # via numpy float64: with Arrow-backed columns to_numeric yields NaN (not NA),
+    # which fillna() on the Arrow dtype would leave in place
+    df["domaincount"] = pd.to_numeric(df["domaincount"], errors="coerce").astype("float64").fillna(0).astype(int)
+
+    # Plain lists over the raw column values: no Series/tuple Series per row
+    cidr_lists = [safe_parse_ranges(s, include_ipv6) for s in df[range_field].to_numpy()]
+    stats = [cidr_count_addrs(lst, include_ipv6) for lst in cidr_lists]
+    df["cidr_count"] = [n for n, _ in stats]
+    df["total_ips"] = [total for _, total in stats]
+    # vectorized; float totals also cover IPv6 sums beyond int64
+    total = df["total_ips"].astype("float64")
+    has_ips = total > 0
+    df["avg_domains_per_ip"] = np.where(has_ips, df["domaincount"] / total.where(has_ips, 1.0), 0.0)
+    df["cidrs"] = [json.dumps(lst, ensure_ascii=False) for lst in cidr_lists]
 
     out_cols = [
         "Organization",
@@ -118,14 +150,28 @@ def compute_capacity_from_args(input_csv: str, output_csv: str, include_ipv6: bo
         "cidrs"
     ]
     out = df[out_cols].sort_values("domaincount", ascending=False)
-    out.to_csv(output_csv, index=False)
+    if output_csv.endswith(".parquet"):  # typed, columnar hand-off to Steps 5/6
+        # total_ips stays numeric: int64/uint64 as built, or an exact
+        # decimal256 when IPv6 totals exceed 64 bits (Python ints in an
+        # object column, which Parquet cannot store)
+        if out["total_ips"].dtype == object:
+            import pyarrow  # to_parquet needs it anyway
+            out = out.assign(total_ips=pd.array(
+                [decimal.Decimal(v) for v in out["total_ips"]],
+                dtype=pd.ArrowDtype(pyarrow.decimal256(76, 0)),
+            ))
+        out.to_parquet(output_csv, compression="zstd", index=False)
+    else:
+        out.to_csv(output_csv, index=False)
     print(f"✅ Wrote {len(out)} organizations to {output_csv}")
 
-def _load_yaml_config(cfg_path: str) -> dict:
+def _load_yaml_config(cfg_path) -> dict:
+    if isinstance(cfg_path, dict):  # already parsed (run_pipeline)
+        return cfg_path
     if yaml is None:
         raise RuntimeError("PyYAML not installed. Use CLI flags or install pyyaml")
     with open(cfg_path, "r", encoding="utf-8") as fh:
-        return yaml.safe_load(fh) or {}
+        return yaml.load(fh, Loader=_YamlLoader) or {}
 
 def compute_capacity(config_path: Optional[str] = None):
     if not config_path:
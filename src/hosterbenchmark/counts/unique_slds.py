@@ -20,12 +20,15 @@ from __future__ import annotations
 
 import argparse
 import csv
+import functools
 import glob
 import json
 import logging
 import os
 import re
+import sys
 from collections import defaultdict
+from itertools import islice
 from typing import Dict, List
 
 try:
@@ -36,15 +39,20 @@ except Exception:
 # ---------- logging ----------
 logger = logging.getLogger("step3.sld_counts_nodedup")
 logger.setLevel(logging.INFO)
-_handler = logging.StreamHandler()
-_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s: %(message)s"))
-logger.addHandler(_handler)
+if not logger.handlers:  # a re-import/reload must not stack a second handler
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s: %(message)s"))
+    logger.addHandler(_handler)
+logger.propagate = False  # own handler only: no second copy via a configured root logger
 
 csv.field_size_limit(10**7)
 
 # ---------- helpers ----------
 
+@functools.lru_cache(maxsize=1 << 20)
 def to_sld(domain: str) -> str | None:
+    # counting is per line without dedup, so the same domains come back
+    # over and over: resolve each distinct spelling once
     if not domain:
         return None
     d = domain.strip().lower().rstrip(".")
@@ -55,13 +63,62 @@ def to_sld(domain: str) -> str | None:
             return get_sld(d)
         except Exception:
             return None
-    # fallback: last two labels
-    parts = d.split(".")
-    return ".".join(parts[-2:]) if len(parts) >= 2 else d
+    # fallback: last two labels, sliced after the second-to-last dot
+    # (no split/join; rfind(..., 0, -1) is -1 when there is no dot at all)
+    return d[d.rfind(".", 0, d.rfind(".")) + 1:]
 
 
 CIDR_V4_RE = re.compile(r"\b(?:\d{1,3}\.){3}\d{1,3}/\d{1,2}\b")
 
+_DIGITS = "0123456789"
+_QUAD_CHARS = _DIGITS + "."
+_SCAN_MIN_CHARS_PER_SLASH = 256
+
+_WRITE_CHUNK = 10_000  # output rows per writerows() call
+
+
+def _is_word_char(c: str) -> bool:
+    return c.isalnum() or c == "_"
+
+
+def _scan_cidrs(s: str) -> List[str]:
+    """
+    Hand-rolled equivalent of CIDR_V4_RE.findall(s) for ASCII input.
+
+    Jumps from '/' to '/' with str.find and only looks at a fixed window
+    around each slash (a dotted quad is at most 15 chars), using C-level
+    rstrip/lstrip instead of the regex engine.
+    """
+    out: List[str] = []
+    n = len(s)
+    last_end = 0
+    slash = s.find("/")
+    while slash != -1:
+        # prefix length: 1-2 digits followed by a word boundary
+        tail = s[slash + 1:slash + 4]
+        k = len(tail) - len(tail.lstrip(_DIGITS))
+        end = slash + 1 + k
+        if 1 <= k <= 2 and not (end < n and _is_word_char(s[end])):
+            # dotted quad: trailing run of digits/dots right before the slash
+            window = s[max(0, slash - 16):slash]
+            run = window[len(window.rstrip(_QUAD_CHARS)):]
+            start = slash - len(run)
+            octets = run.split(".")
+            quad = ".".join(octets[-4:])
+            if (
+                len(octets) >= 4
+                and all(1 <= len(o) <= 3 for o in octets[-4:])
+                # with exactly four octets the match begins at `start`, which must be a word boundary
+                and not (len(octets) == 4 and start > 0 and _is_word_char(s[start - 1]))
+                # findall() matches never overlap
+                and slash - len(quad) >= last_end
+            ):
+                out.append(quad + "/" + tail[:k])
+                last_end = end
+        slash = s.find("/", slash + 1)
+    return out
+
+
 def _parse_range_list_value(raw: str) -> List[str]:
     """Flexible parser for a cell containing CIDR ranges."""
     if raw is None:
@@ -99,7 +156,10 @@ def _parse_range_list_value(raw: str) -> List[str]:
         if cand:
             return cand
 
-    # Regex fallback (IPv4 only)
+    # Fallback (IPv4 only). The scanner costs per '/', the regex per character,
+    # so only hand long, sparse cells to the scanner.
+    if s.count("/") * _SCAN_MIN_CHARS_PER_SLASH < len(s):
+        return _scan_cidrs(s)
     return CIDR_V4_RE.findall(s)
 
 
@@ -124,7 +184,8 @@ def load_hoster_cidrs(path: str) -> Dict[str, List[str]]:
                 break
     delim = "|" if head.count("|") >= head.count(",") else ","
 
-    out = defaultdict(list)
+    # accumulate straight into sets: no list regrowth, no second dedup copy
+    out: Dict[str, set] = defaultdict(set)
     with open(path, "r", encoding="utf-8", errors="ignore", newline="") as fh:
         rdr = csv.DictReader(fh, delimiter=delim)
         headers = [h.strip() for h in (rdr.fieldnames or [])]
@@ -158,9 +219,10 @@ def load_hoster_cidrs(path: str) -> Dict[str, List[str]]:
                 continue
             cidrs = _parse_range_list_value(raw_ranges)
             if cidrs:
-                out[org].extend(cidrs)
+                # the same prefixes recur across orgs/rows: share one str each
+                out[sys.intern(org)].update(map(sys.intern, cidrs))
 
-    return {k: sorted(set(v)) for k, v in out.items()}
+    return {k: sorted(v) for k, v in out.items()}
 
 
 # ---------- core step (NO DEDUP) ----------
@@ -224,15 +286,21 @@ def _write_output(
         except Exception as e:
             logger.warning(f"Could not load CIDR map from {cidr_map_path}: {e}")
 
-    with open(out_csv, "w", newline="", encoding="utf-8") as out:
+    rows = (
+        # store CIDRs as a JSON array to keep a single cell
+        (org, cnt, json.dumps(cidrs_by_org.get(org, []), ensure_ascii=False))
+        for org, cnt in sorted(counts.items(), key=lambda x: (-x[1], x[0]))
+        if cnt >= threshold
+    )
+    # 1 MiB write buffer, rows handed to the csv module in blocks
+    with open(out_csv, "w", newline="", encoding="utf-8", buffering=1 << 20) as out:
         w = csv.writer(out, delimiter="|")
         w.writerow(["Organization", "domaincount", "cidrs"])
-        for org, cnt in sorted(counts.items(), key=lambda x: (-x[1], x[0])):
-            if cnt >= threshold:
-                cidrs = cidrs_by_org.get(org, [])
-                # store as JSON array to keep a single cell
-                cidr_cell = json.dumps(cidrs, ensure_ascii=False)
-                w.writerow([org, cnt, cidr_cell])
+        while True:
+            chunk = list(islice(rows, _WRITE_CHUNK))
+            if not chunk:
+                break
+            w.writerows(chunk)
 
 
 # ---------- CLI / config ----------
@@ -242,13 +310,17 @@ def count_unique_slds(config_path: str):
     Retains CLI/API compatibility with previous name but now counts occurrences
     (no dedup). Reads YAML config and runs the step.
     """
-    try:
-        import yaml as _yaml
-    except ImportError as e:
-        raise RuntimeError("Install pyyaml: pip install pyyaml") from e
+    if isinstance(config_path, dict):  # already parsed (run_pipeline)
+        cfg = config_path
+    else:
+        try:
+            import yaml as _yaml
+        except ImportError as e:
+            raise RuntimeError("Install pyyaml: pip install pyyaml") from e
 
-    with open(config_path, "r", encoding="utf-8") as fh:
-        cfg = _yaml.safe_load(fh) or {}
+        with open(config_path, "r", encoding="utf-8") as fh:
+            # libyaml-backed loader when PyYAML was built with it
+            cfg = _yaml.load(fh, Loader=getattr(_yaml, "CSafeLoader", _yaml.SafeLoader)) or {}
 
     paths = cfg.get("paths", {}) or {}
     outputs = cfg.get("outputs", {}) or {}
@@ -20,6 +20,8 @@ import ast
 
 try:
     import yaml
+    # libyaml-backed loader when PyYAML was built with it
+    _YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 except ImportError:
     yaml = None
 
@@ -32,9 +34,11 @@ from hosterbenchmark.feeds.parsers import load_hosters  # reuse existing logic
 LOG_FORMAT = "%(asctime)s %(levelname)s: %(message)s"
 logger = logging.getLogger("step2.enrich")
 logger.setLevel(logging.INFO)
-_handler = logging.StreamHandler()
-_handler.setFormatter(logging.Formatter(LOG_FORMAT))
-logger.addHandler(_handler)
+if not logger.handlers:  # a re-import/reload must not stack a second handler
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    logger.addHandler(_handler)
+logger.propagate = False  # own handler only: no second copy via a configured root logger
 
 
 # --------------------------------
@@ -55,7 +59,7 @@ def process_file(path: str, out_dir: str, ranges: List[Tuple[str, str]]) -> dict
 
     try:
         with gzip.open(path, "rt", encoding="utf-8", errors="replace") as fin, \
-             open(out_path, "w", encoding="utf-8") as fout:
+             open(out_path, "w", encoding="utf-8", buffering=1 << 20) as fout:
 
             for line in fin:
                 stats["lines"] += 1
@@ -121,11 +125,13 @@ def enrich_pairs_from_args(input_glob: str, hosters_path: str, out_dir: str, pro
     logger.info("Step2: done")
 
 
-def _load_yaml_config(cfg_path: str) -> dict:
+def _load_yaml_config(cfg_path) -> dict:
+    if isinstance(cfg_path, dict):  # already parsed (run_pipeline)
+        return cfg_path
     if yaml is None:
         raise RuntimeError("PyYAML not installed; install pyyaml or pass CLI flags instead.")
     with open(cfg_path, "r", encoding="utf-8") as fh:
-        return yaml.safe_load(fh) or {}
+        return yaml.load(fh, Loader=_YamlLoader) or {}
 
 
 def enrich_pairs(config_path: Optional[str] = None) -> None:
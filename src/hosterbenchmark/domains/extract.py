@@ -34,6 +34,8 @@ from typing import Iterable, List, Optional
 
 try:
     import yaml  # optional; only needed if --config is used
+    # libyaml-backed loader when PyYAML was built with it
+    _YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 except Exception:
     yaml = None
 
@@ -45,9 +47,11 @@ from tld import get_fld
 LOG_FORMAT = "%(asctime)s %(levelname)s: %(message)s"
 logger = logging.getLogger("step1.extract")
 logger.setLevel(logging.INFO)
-_handler = logging.StreamHandler()
-_handler.setFormatter(logging.Formatter(LOG_FORMAT))
-logger.addHandler(_handler)
+if not logger.handlers:  # a re-import/reload must not stack a second handler
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    logger.addHandler(_handler)
+logger.propagate = False  # own handler only: no second copy via a configured root logger
 
 # ----------------------------
 # DNS label validation (RFC 1035-ish)
@@ -183,11 +187,13 @@ def extract_dnsdb_from_args(glob_pat: str, out_dir: str, processes: int = 1) ->
     logger.info("Step1: done")
 
 
-def _load_yaml_config(cfg_path: str) -> dict:
+def _load_yaml_config(cfg_path) -> dict:
+    if isinstance(cfg_path, dict):  # already parsed (run_pipeline)
+        return cfg_path
     if yaml is None:
         raise RuntimeError("PyYAML not installed; install pyyaml or pass CLI flags instead.")
     with open(cfg_path, "r", encoding="utf-8") as fh:
-        return yaml.safe_load(fh) or {}
+        return yaml.load(fh, Loader=_YamlLoader) or {}
 
 
 def extract_dnsdb(config_path: Optional[str] = None) -> None:
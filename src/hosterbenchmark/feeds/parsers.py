@@ -1,19 +1,29 @@
 from __future__ import annotations
 
 import csv
+import functools
 import gzip
 import io
 import ipaddress
 import json
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Dict, Iterable, List, Optional, Tuple, Callable, Any, Union
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Callable, Any, Union
 import os
 import glob
 import ast
+import mmap
+import socket
+import sys
 from typing import Tuple
 import ipaddress
 
+try:
+    import pyarrow  # optional; enables the multi-threaded Arrow CSV reader
+    import pyarrow.csv as pacsv
+except ImportError:
+    pyarrow = None
+
 # --------------------------------------------------------------------------------------
 # Helpers used by parsers (kept here to avoid import cycles)
 # --------------------------------------------------------------------------------------
@@ -27,15 +37,130 @@ def open_maybe_gzip(path: str, mode: str = "rt", **kw):
         return gzip.open(path, mode, **kw)
     return open(path, mode, **kw)
 
+
+def prefetch(path: str) -> None:
+    """Ask the kernel to start reading `path` into the page cache (best effort)."""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+# Arrow parses in blocks and a row may not straddle two of them (default
+# 1 MiB). Step 3 allows cidrs cells up to csv.field_size_limit(10**7).
+_ARROW_BLOCK = 16 << 20  # 16 MiB
+
+
+def read_csv_arrow(path: str, sep: str = ",", as_text: bool = False):
+    """
+    Read a CSV (or .gz CSV) into a pyarrow Table with Arrow's multi-threaded
+    parser. With `as_text`, every column is read as a string (no inference,
+    blanks stay ""). Returns None when pyarrow is not installed or cannot
+    parse the file (e.g. a row longer than a block); callers then use
+    pandas' C reader.
+    """
+    if pyarrow is None:
+        return None
+    convert = None
+    if as_text:
+        # all-string schema from the header: inferring and then casting
+        # would rewrite values ("007" -> "7")
+        with open_maybe_gzip(path, "rt", encoding="utf-8", newline="") as fh:
+            header = next(csv.reader(fh, delimiter=sep), [])
+        convert = pacsv.ConvertOptions(
+            column_types={c: pyarrow.string() for c in header},
+            strings_can_be_null=False,
+            quoted_strings_can_be_null=False,
+        )
+    try:
+        return pacsv.read_csv(
+            path,
+            read_options=pacsv.ReadOptions(block_size=_ARROW_BLOCK),
+            parse_options=pacsv.ParseOptions(delimiter=sep),
+            convert_options=convert,
+        )
+    except pyarrow.ArrowInvalid:
+        return None
+
+_MMAP_CHUNK = 16 << 20  # 16 MiB
+
+
+def iter_lines(path: str, encoding: str = "utf-8", errors: str = "ignore",
+               chunk_size: int = _MMAP_CHUNK) -> Iterable[str]:
+    """
+    Yield the lines of a plain text or gzip file, without trailing newline.
+
+    Plain files are mmap'ed and split in large chunks (one decode per chunk)
+    instead of going through the io stack once per line; the kernel is told
+    the access is sequential so it can read ahead. Gzip files fall back to
+    normal line iteration.
+    """
+    if path.endswith(".gz"):
+        with open_maybe_gzip(path, "rt", encoding=encoding, errors=errors) as fh:
+            for line in fh:
+                yield line.rstrip("\n")
+        return
+
+    with open(path, "rb") as fh:
+        if hasattr(os, "posix_fadvise"):
+            try:
+                os.posix_fadvise(fh.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            except OSError:
+                pass
+        try:
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            return
+        with mm:
+            if hasattr(mmap, "MADV_SEQUENTIAL"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            carry = b""
+            split_crlf = False  # previous block ended on "\r": drop a leading "\n"
+            for pos in range(0, len(mm), chunk_size):
+                block = mm[pos:pos + chunk_size]
+                if split_crlf and block[:1] == b"\n":
+                    block = block[1:]
+                cut = max(block.rfind(b"\n"), block.rfind(b"\r"))
+                if cut == -1:
+                    carry += block
+                    split_crlf = False
+                    continue
+                split_crlf = cut == len(block) - 1 and block[cut:] == b"\r"
+                end = cut - 1 if block[cut - 1:cut + 1] == b"\r\n" else cut
+                text = (carry + block[:end]).decode(encoding, errors)
+                carry = block[cut + 1:]
+                if "\r" in text:
+                    # universal newlines ("\r\n", "\r"), as text-mode open() reads them
+                    text = text.replace("\r\n", "\n").replace("\r", "\n")
+                yield from text.split("\n")
+            if carry:
+                yield carry.decode(encoding, errors)
+
 def safe_ip(s: Optional[str]) -> Optional[str]:
     """
     Validate IP (v4/v6). Returns normalized string or None.
+
+    IPv4 is validated by inet_pton in C; it accepts exactly the dotted quads
+    ipaddress accepts (no leading zeros), which are already normalized.
     """
     if not s:
         return None
     s = s.strip()
     if not s:
         return None
+    if ":" not in s:
+        try:
+            socket.inet_pton(socket.AF_INET, s)
+            return s
+        except (OSError, ValueError):
+            return None
     try:
         return str(ipaddress.ip_address(s))
     except Exception:
@@ -180,7 +305,7 @@ def _parse_cidrs_field(raw: str | list | None) -> list[str]:
     for c in cand:
         norm = _safe_cidr(c)
         if norm:
-            out.append(norm)
+            out.append(sys.intern(norm))  # prefixes repeat across orgs
     return out
 
 # -----------------------------
@@ -201,10 +326,22 @@ def load_hosters(path: str) -> Tuple[dict[str, list[str]], dict[str, dict]]:
       (hosters, meta)
        - hosters: { org_name: [cidr, cidr, ...] }
        - meta:    { org_name: {"Size": int, "Country_hist": dict, "cidr_count": int} }
+
+    The result for the latest (path, mtime, size) is cached, so Step 2 and
+    Step 5 of one pipeline run parse the file once. The returned dicts are
+    shared between callers and must not be mutated; call
+    load_hosters.cache_clear() once they are no longer needed, so they do
+    not stay alive for the rest of the process. The cache is not locked:
+    two threads missing it at the same time both parse the file.
     """
     if not path or not os.path.isfile(path):
         raise FileNotFoundError(f"hosters_file not found: {path}")
+    st = os.stat(path)
+    return _load_hosters_cached(os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
 
+@functools.lru_cache(maxsize=1)  # one file's dicts can take hundreds of MB
+def _load_hosters_cached(path: str, _mtime_ns: int, _size: int) -> Tuple[dict[str, list[str]], dict[str, dict]]:
     # Pick delimiter by peeking first line
     with open_maybe_gzip(path, "rt", encoding="utf-8", errors="ignore") as fh:
         first = fh.readline()
@@ -237,7 +374,7 @@ def load_hosters(path: str) -> Tuple[dict[str, list[str]], dict[str, dict]]:
             )
 
         for row in rdr:
-            org = (row.get(col_org) or "").strip()
+            org = sys.intern((row.get(col_org) or "").strip())
             if not org:
                 continue
             cidrs = _parse_cidrs_field(row.get(col_ranges))
@@ -250,15 +387,16 @@ def load_hosters(path: str) -> Tuple[dict[str, list[str]], dict[str, dict]]:
             size_val = row.get(col_size) if col_size else None
             hist_val = row.get(col_hist) if col_hist else None
 
+            # cheap shape checks first: most rows are well-formed and raising
+            # (and catching) an exception per row is the expensive path
             size = None
             if size_val not in (None, ""):
-                try:
-                    size = int(str(size_val).strip())
-                except Exception:
-                    size = None
+                v = str(size_val).strip().replace(",", "")
+                if (v[1:] if v[:1] == "-" else v).isdecimal():  # exactly -?digits
+                    size = int(v)
 
             hist = {}
-            if hist_val not in (None, ""):
+            if hist_val not in (None, "") and str(hist_val).lstrip()[:1] == "{":
                 s = str(hist_val).strip()
                 # Try JSON then Python literal
                 try:
@@ -281,10 +419,23 @@ def load_hosters(path: str) -> Tuple[dict[str, list[str]], dict[str, dict]]:
 
     return hosters, meta
 
+load_hosters.cache_clear = _load_hosters_cached.cache_clear
+
 # --------------------------------------------------------------------------------------
 # Registry & decorator
 # --------------------------------------------------------------------------------------
 
+class FeedRecord(NamedTuple):
+    """
+    One feed observation, as yielded by every parser's iter_records().
+    A tuple rather than a dict: no per-record hash table, positional access.
+    """
+    domain: Optional[str]
+    ips: List[str]
+    timestamp: Optional[int]
+    source: str
+
+
 FEED_REGISTRY: Dict[str, Any] = {}
 
 def register_feed(cls):
@@ -293,7 +444,7 @@ def register_feed(cls):
     The class must implement:
       - NAME: str
       - COUNT_DOMAINS: bool
-      - iter_records(path: str) -> Iterable[dict]
+      - iter_records(path: str) -> Iterable[FeedRecord]
     """
     name = getattr(cls, "NAME", None)
     if not name:
@@ -309,10 +460,10 @@ class BaseFeedParser:
     NAME: str = "base"
     COUNT_DOMAINS: bool = False  # True if records contain reliable domain signal
 
-    def iter_records(self, path: str) -> Iterable[dict]:
+    def iter_records(self, path: str) -> Iterable[FeedRecord]:
         """
-        Yield dicts with shape:
-          {"domain": <string>, "ips": [<ip strings>], "timestamp": <int|None>, "source": <feed name>}
+        Yield FeedRecord(domain=<string>, ips=[<ip strings>],
+                         timestamp=<int|None>, source=<feed name>)
         """
         raise NotImplementedError
 
@@ -352,7 +503,7 @@ class APWGCSV_IPOnly(BaseFeedParser):
                     pass
                 ips_list = sorted(ips)
                 # Use first IP as domain placeholder (COUNT_DOMAINS=False)
-                yield {"domain": ips_list[0], "ips": ips_list, "timestamp": ts, "source": self.NAME}
+                yield FeedRecord(ips_list[0], ips_list, ts, self.NAME)
 
 @register_feed
 class DShieldDaily_IPOnly(BaseFeedParser):
@@ -383,20 +534,19 @@ class DShieldDaily_IPOnly(BaseFeedParser):
         return safe_ip(s)
 
     def iter_records(self, path: str):
-        with open_maybe_gzip(path, "rt", encoding="utf-8", errors="ignore") as fh:
-            for line in fh:
-                s = line.strip()
-                if not s or s.startswith("#"):
-                    continue
-                if s.lower().startswith("source ip"):
-                    continue
-                cols = s.split("\t")
-                if not cols:
-                    continue
-                ip = self._normalize_ipv4(cols[0])
-                if not ip:
-                    continue
-                yield {"domain": ip, "ips": [ip], "timestamp": None, "source": self.NAME}
+        for line in iter_lines(path):
+            s = line.strip()
+            if not s or s.startswith("#"):
+                continue
+            if s.lower().startswith("source ip"):
+                continue
+            cols = s.split("\t")
+            if not cols:
+                continue
+            ip = self._normalize_ipv4(cols[0])
+            if not ip:
+                continue
+            yield FeedRecord(ip, [ip], None, self.NAME)
 
 @register_feed
 class OpenPhishJSON_IPOnly(BaseFeedParser):
@@ -575,7 +725,7 @@ class ShadowserverCSV_IPOnly(BaseFeedParser):
                 if not ip:
                     continue
                 ts = self._parse_ts(row, ts_col)
-                yield {"domain": ip, "ips": [ip], "timestamp": ts, "source": self.NAME}
+                yield FeedRecord(ip, [ip], ts, self.NAME)
 
 @register_feed
 class SpamhausEXBL_JSONL_IPOnly(BaseFeedParser):
@@ -640,7 +790,7 @@ class SpamhausEXBL_JSONL_IPOnly(BaseFeedParser):
                         if not ips:
                             continue
                         ts = self._ts_from_obj(obj)
-                        yield {"domain": ips[0], "ips": ips, "timestamp": ts, "source": self.NAME}
+                        yield FeedRecord(ips[0], ips, ts, self.NAME)
                     return
 
             # Otherwise JSONL (one object per line)
@@ -658,7 +808,7 @@ class SpamhausEXBL_JSONL_IPOnly(BaseFeedParser):
                 if not ips:
                     continue
                 ts = self._ts_from_obj(obj)
-                yield {"domain": ips[0], "ips": ips, "timestamp": ts, "source": self.NAME}
+                yield FeedRecord(ips[0], ips, ts, self.NAME)
 
 @register_feed
 class BlocklistDe_IPOnly(BaseFeedParser):
@@ -684,15 +834,14 @@ class BlocklistDe_IPOnly(BaseFeedParser):
         return safe_ip(s)
 
     def iter_records(self, path: str):
-        with open_maybe_gzip(path, "rt", encoding="utf-8", errors="ignore") as fh:
-            for line in fh:
-                s = line.strip()
-                if not s or s.startswith("#") or s.startswith(";"):
-                    continue
-                ip = self._normalize_ipv4(s)
-                if not ip:
-                    continue
-                yield {"domain": ip, "ips": [ip], "timestamp": None, "source": self.NAME}
+        for line in iter_lines(path):
+            s = line.strip()
+            if not s or s.startswith("#") or s.startswith(";"):
+                continue
+            ip = self._normalize_ipv4(s)
+            if not ip:
+                continue
+            yield FeedRecord(ip, [ip], None, self.NAME)
 
 @register_feed
 class ThreatFoxJSON_IPOnly(BaseFeedParser):
@@ -757,4 +906,4 @@ class ThreatFoxJSON_IPOnly(BaseFeedParser):
                 if not ips:
                     continue
                 ts = self._ts_from_obj(obj)
-                yield {"domain": ips[0], "ips": ips, "timestamp": ts, "source": self.NAME}
+                yield FeedRecord(ips[0], ips, ts, self.NAME)
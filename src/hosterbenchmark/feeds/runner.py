@@ -5,7 +5,8 @@ Step 5 — Ingest IP-only abuse feeds and count hits per hoster.
 Inputs (from pipeline.yaml):
   - feeds_file: path to YAML with a 'feeds:' list of {name, path}
   - hosters_file: path to hoster/CIDR mapping (MaxMind-derived CSV/pipe)
-  - paths.lmdb_dir: directory for LMDB environment
+  - paths.lmdb_dir: directory for LMDB environment (and the parsed-hosters
+    cache, a pickle: must be a trusted directory)
   - outputs.capacity_csv: Step 4 output with capacity columns
 
 Outputs:
@@ -15,79 +16,372 @@ Outputs:
 from __future__ import annotations
 
 import os
-import re
+import sys
 import csv
+import hashlib
+import json
+import pickle
+import functools
 import argparse
 import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import contextmanager, nullcontext
+from itertools import islice
 from typing import Dict, List, Tuple
 
+import pandas as pd
+
 try:
     import yaml
+    # libyaml-backed loader when PyYAML was built with it (yaml.__with_libyaml__)
+    _YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 except ImportError:
     yaml = None
 
 from hosterbenchmark.feeds.parsers import (
     FEED_REGISTRY,
     load_hosters,     # returns dict[str, list[str]]  hoster -> [cidrs...]
+    prefetch,         # posix_fadvise(WILLNEED) page-cache warm-up
     _expand_files,    # glob/dir expansion helper
 )
-from hosterbenchmark.feeds.store import Store, Processor
+from hosterbenchmark.feeds.store import Store, Processor, HosterIndex
 
 
 logger = logging.getLogger("hosterbenchmark.step5")
 logger.setLevel(logging.INFO)
-_handler = logging.StreamHandler()
-_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s: %(message)s"))
-logger.addHandler(_handler)
+if not logger.handlers:  # a re-import/reload must not stack a second handler
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s: %(message)s"))
+    logger.addHandler(_handler)
+logger.propagate = False  # own handler only: no second copy via a configured root logger
 
 
 # ---------------------------- utils ----------------------------
 
-_STRIP_QUOTES_RE = re.compile(r"""^\s*['"]?(.*?)['"]?\s*$""")
-
+@functools.lru_cache(maxsize=None)
 def normalize_name(s: str) -> str:
+    # pure, and called with the same few thousand org names for every
+    # hoster, capacity row and Step 2 triplet -> normalize each one once
     if s is None:
         return ""
-    # strip outer quotes/apostrophes and whitespace
-    m = _STRIP_QUOTES_RE.match(str(s))
-    return (m.group(1) if m else str(s)).strip()
+    # strip whitespace, then outer quotes/apostrophes, then whitespace inside them
+    return str(s).strip().strip("\"'").strip()
 
 
-def _load_yaml(fp: str) -> dict:
+def _load_yaml(fp) -> dict:
+    if isinstance(fp, dict):  # already parsed (run_pipeline)
+        return fp
     if yaml is None:
         raise RuntimeError("pyyaml is required to read YAML config files")
     with open(fp, "r", encoding="utf-8") as fh:
-        return yaml.safe_load(fh) or {}
+        return yaml.load(fh, Loader=_YamlLoader) or {}
+
+
+# Cache of the Step 2 sld->org map, written next to the Step 2 outputs
+SLD_ORG_SIDECAR = "sld_org_map.json"
+
+# Cache of the parsed hosters file, kept in paths.lmdb_dir
+HOSTERS_SIDECAR = "hosters.pickle"
+# Part of every sidecar key: bump when the layout of a cached value changes,
+# so a pickle left by an older version is rebuilt instead of loaded
+_SIDECAR_VERSION = 1
+
+# Step 2 triplet rows per read_csv chunk when building the sld->org map
+_SLD_ORG_CHUNK = 1_000_000
+
+# Records ingested between two checks of the Step 5 commit policy
+_COMMIT_CHECK = 10_000
 
+# Step 4 columns carried forward into the Step 5 output, in output order
+CAP_COLS = ("domaincount", "cidr_count", "total_ips", "avg_domains_per_ip", "cidrs")
 
-def _load_capacity_map(capacity_csv: str) -> Dict[str, dict]:
+
+def _cached_by_stat(sidecar: str, src: str, build):
+    """
+    Return build(), pickled to `sidecar` and reused while `src` keeps its
+    path, size and mtime (and _SIDECAR_VERSION is unchanged). Any problem
+    with the sidecar just means a rebuild.
+
+    The sidecar is unpickled, so it must live in a trusted directory: a
+    crafted pickle there runs code when loaded.
+    """
+    try:
+        st = os.stat(src)
+    except OSError:
+        return build()  # nothing to key on (build() reports missing inputs)
+    key = (_SIDECAR_VERSION, os.path.abspath(src), st.st_size, st.st_mtime_ns)
+    try:
+        with open(sidecar, "rb") as fh:
+            cached_key, value = pickle.load(fh)
+        if cached_key == key:
+            logger.info(f"Step 5: reusing {sidecar}")
+            return value
+    except Exception:
+        pass  # missing, stale or unreadable: rebuild
+
+    value = build()
+    try:
+        os.makedirs(os.path.dirname(sidecar) or ".", exist_ok=True)
+        tmp = f"{sidecar}.tmp"
+        with open(tmp, "wb") as fh:
+            pickle.dump((key, value), fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, sidecar)  # atomic: readers never see a partial sidecar
+    except OSError as e:
+        logger.warning(f"Step 5: could not write {sidecar}: {e}")
+    return value
+
+
+def _load_hosters_normalized(hosters_file: str) -> Dict[str, List[str]]:
+    """load_hosters() keyed by normalized org name (metadata dropped)."""
+    loaded = load_hosters(hosters_file)
+    if isinstance(loaded, tuple):
+        hosters_raw, _meta = loaded
+    else:
+        hosters_raw, _meta = loaded, {}
+    return {normalize_name(k): v for k, v in hosters_raw.items()}
+
+
+@contextmanager
+def _open_table_rows(path: str):
+    """Rows of a CSV (or Parquet, by extension) as lists of str, header first."""
+    if path.endswith(".parquet"):
+        df = pd.read_parquet(path)
+        df = df.astype(str).where(df.notna(), "")
+        yield iter([list(df.columns), *df.values.tolist()])
+        return
+    with open(path, "r", encoding="utf-8", newline="") as fh:
+        yield csv.reader(fh)
+
+
+def _load_capacity_map(capacity_csv: str) -> Dict[str, Tuple[str, ...]]:
     """
     Load step4 capacity so we can carry its columns into the final CSV
     even when no feeds are ingested.
 
-    Returns: { normalized_hoster: row_dict }
-    Keys include: Organization, domaincount, cidr_count, total_ips,
-    avg_domains_per_ip, cidrs, etc.
+    Returns: { normalized_hoster: (value for each of CAP_COLS) }
+    Missing capacity columns come back as "".
     """
-    out: Dict[str, dict] = {}
+    out: Dict[str, Tuple[str, ...]] = {}
     if not capacity_csv or not os.path.isfile(capacity_csv):
         logger.info("Step 5: capacity CSV not found, continuing without carry-forward data")
         return out
-    with open(capacity_csv, "r", encoding="utf-8", newline="") as fh:
-        rdr = csv.DictReader(fh)
+    with _open_table_rows(capacity_csv) as rdr:
+        header = next(rdr, None) or []
+        # resolve column positions once instead of building a dict per row
+        org_cols = [header.index(c) for c in ("Organization", "hoster") if c in header]
+        cap_idx = [header.index(c) if c in header else None for c in CAP_COLS]
+        width = len(header)
         for r in rdr:
-            org_raw = r.get("Organization") or r.get("hoster") or ""
+            if len(r) < width:
+                r += [""] * (width - len(r))
+            org_raw = next((r[i] for i in org_cols if r[i]), "")
             org = normalize_name(org_raw)
             if not org:
                 continue
-            out[org] = r
+            # values (incl. the JSON 'cidrs' list, which can be huge) are
+            # emitted verbatim: never re-parse or re-encode them here
+            out[org] = tuple("" if i is None else r[i] for i in cap_idx)
     logger.info(f"Step 5: loaded {len(out)} capacity rows from {capacity_csv}")
     return out
 
 
+@functools.lru_cache(maxsize=None)
+def _get_parser(feed_name: str):
+    """Resolve a FEED_REGISTRY entry (class or instance) once per feed and process."""
+    parser_entry = FEED_REGISTRY[feed_name]
+    if isinstance(parser_entry, type) or not hasattr(parser_entry, "iter_records"):
+        return parser_entry()
+    return parser_entry
+
+
+def _step2_fingerprint(files: List[str]) -> str:
+    """Cheap identity of the Step 2 outputs: name, size and mtime of each file."""
+    h = hashlib.sha1()
+    for fp in files:
+        st = os.stat(fp)
+        h.update(f"{os.path.basename(fp)}\0{st.st_size}\0{st.st_mtime_ns}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _build_sld_org_from_step2(step2_dir: str) -> Dict[str, str]:
+    """
+    sld -> normalized org from the Step 2 triplet files ("sld | ip | org"),
+    first occurrence wins. Parsed with pandas' C reader instead of a Python
+    split/strip per line; the result is cached in a JSON sidecar
+    (SLD_ORG_SIDECAR) and reused while the Step 2 files are unchanged.
+    """
+    files = sorted(
+        os.path.join(step2_dir, name)
+        for name in os.listdir(step2_dir)
+        if name.startswith("step3_enriched_") and name.endswith(".txt")
+    )
+    files = [fp for fp in files if os.path.getsize(fp) > 0]  # read_csv rejects empty files
+    if not files:
+        return {}
+
+    sidecar = os.path.join(step2_dir, SLD_ORG_SIDECAR)
+    key = _step2_fingerprint(files)
+    try:
+        with open(sidecar, "r", encoding="utf-8") as fh:
+            cached = json.load(fh)
+        if cached.get("key") == key:
+            logger.info(f"Step 5: reusing sld->org map from {sidecar}")
+            return cached["map"]
+    except (OSError, ValueError, KeyError, AttributeError):
+        pass  # missing, stale or unreadable: rebuild
+
+    # chunked and deduplicated as we go: Step 2 output grows with DNS volume,
+    # peak memory only with the number of distinct SLDs
+    out: Dict[str, str] = {}
+    norm: Dict[str, str] = {}
+    for fp in files:
+        for df in pd.read_csv(
+            fp, sep="|", header=None, names=["sld", "ip", "org"], index_col=False,
+            usecols=["sld", "org"], dtype=str, keep_default_na=False,
+            quoting=csv.QUOTE_NONE, encoding="utf-8", engine="c",
+            chunksize=_SLD_ORG_CHUNK,
+        ):
+            sld = df["sld"].fillna("").str.strip()
+            org = df["org"].fillna("")
+            keep = sld != ""
+            sld, org = sld[keep], org[keep]
+            # normalize each distinct org once, then map
+            for o in org.unique():
+                if o not in norm:
+                    norm[o] = normalize_name(o)
+            org = org.map(norm)
+            named = org != ""
+            # first occurrence wins: within the chunk, then against earlier chunks
+            pairs = pd.DataFrame({"sld": sld[named], "org": org[named]}).drop_duplicates("sld")
+            for s, o in zip(pairs["sld"], pairs["org"]):
+                out.setdefault(s, o)
+
+    try:
+        tmp = f"{sidecar}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"key": key, "map": out}, fh, ensure_ascii=False)
+        os.replace(tmp, sidecar)  # atomic: readers never see a partial sidecar
+    except OSError as e:
+        logger.warning(f"Step 5: could not write {sidecar}: {e}")
+    return out
+
+
+def _iter_file_records(feed_name: str, path: str):
+    """Yield the records of one feed file; parse errors end the file with a warning."""
+    try:
+        yield from _get_parser(feed_name).iter_records(path)
+    except Exception as e:
+        logger.warning(f"Error in {path}: {e}")
+
+
+def _iter_file_hits(feed_name: str, path: str, index: HosterIndex):
+    """
+    Yield (domain, [(owner, ip), ...]) per record of one feed file, dropping
+    IPs of unknown hosters and records without any known hoster.
+    """
+    owned = index.owned
+    for domain, ips, _ts, _src in _iter_file_records(feed_name, path):
+        if not ips:
+            continue
+        hits = owned(ips)
+        if hits:
+            yield domain, hits
+
+
+_worker_index: HosterIndex | None = None
+
+
+def _init_worker(hosters: Dict[str, List[str]]) -> None:
+    """Pool initializer: each worker builds its own IP -> hoster index once."""
+    global _worker_index
+    _worker_index = HosterIndex(hosters)
+
+
+def _parse_feed_file(feed_name: str, path: str) -> list:
+    """
+    Worker: parse one feed file (feed files are independent) and resolve IP
+    owners, so only hits travel back to the writer.
+    """
+    return list(_iter_file_hits(feed_name, path, _worker_index))
+
+
+def _serial_batches(jobs, index):
+    """Yield (feed, file, hits) in order, parsing each file lazily in this process."""
+    for i, (feed_name, f) in enumerate(jobs):
+        if i + 1 < len(jobs):
+            prefetch(jobs[i + 1][1])  # warm the page cache for the next file
+        yield feed_name, f, _iter_file_hits(feed_name, f, index)
+
+
+def _pooled_batches(ex, jobs, window):
+    """
+    Yield (feed, file, hits) in completion order. Files of all feeds share
+    the pool (no idle workers at feed boundaries); at most `window` files are
+    in flight so parsed-but-unwritten hits stay bounded.
+    """
+    todo = iter(jobs)
+    pending = {}
+
+    def submit():
+        for feed_name, f in islice(todo, window - len(pending)):
+            pending[ex.submit(_parse_feed_file, feed_name, f)] = (feed_name, f)
+
+    submit()
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        finished = [(pending.pop(fut), fut) for fut in done]
+        submit()  # refill before writing so workers stay busy meanwhile
+        for (feed_name, f), fut in finished:
+            yield feed_name, f, fut.result()
+
+
+def _write_counts_csv(output_csv, feeds_to_report, output_names, capacity_map,
+                      perfeed_by_hoster, summary) -> None:
+    """
+    Write the Step 5 CSV: one row per hoster in output_names with per-feed IP
+    counts, the store summary columns and the carried-forward capacity.
+    summary: (domaincount_seen, ipcount_seen, ipcount_shared, domaincount_shared) dicts.
+    """
+    header = ["hoster"]
+    for feed in feeds_to_report:
+        header.append(f"{feed}_ips")
+    header += ["domaincount_seen", "ipcount_seen", "ipcount_shared", "domaincount_shared"]
+    header += CAP_COLS
+
+    domaincount_seen, ipcount_seen, ipcount_shared_map, domaincount_shared = summary
+
+    # Build the table column by column (one comprehension per column), then
+    # let writerows() stitch the rows together in C via zip()
+    empty_cap = ("",) * len(CAP_COLS)
+    no_feeds: Dict[str, int] = {}
+    feeds_of = [perfeed_by_hoster.get(h, no_feeds) for h in output_names]
+    columns = [output_names]
+    # feed columns (zeros if none); csv.writer formats the ints itself
+    columns += [[fc.get(feed, 0) for fc in feeds_of] for feed in feeds_to_report]
+    # store summary (zeros if none)
+    columns += [
+        [counts.get(h, 0) for h in output_names]
+        for counts in (domaincount_seen, ipcount_seen, ipcount_shared_map, domaincount_shared)
+    ]
+    # capacity carry-forward (always filled for capacity universe)
+    columns += zip(*[capacity_map.get(h, empty_cap) for h in output_names])
+
+    # 1 MiB write buffer instead of the 8 KiB default: far fewer write() syscalls
+    with open(output_csv, "w", newline="", encoding="utf-8", buffering=1 << 20) as outfh:
+        w = csv.writer(outfh)
+        w.writerow(header)
+        w.writerows(zip(*columns))
+
+
 # ---------------------------- core ----------------------------
 
-def ingest_and_export(config_path: str) -> None:
+def ingest_and_export(config_path: str, capacity_ready=None) -> None:
+    """
+    Run Step 5. capacity_ready: optional future of a Step 4 that is still
+    running (see run_pipeline); feeds are ingested meanwhile and the
+    capacity table is only read once it completes, right before the export.
+    """
     cfg = _load_yaml(config_path)
 
     feeds_conf   = cfg.get("feeds_file")
@@ -98,8 +392,15 @@ def ingest_and_export(config_path: str) -> None:
 
     lmdb_dir     = paths.get("lmdb_dir")
     output_csv   = outputs.get("hoster_counts_csv")
-    commit_every = int(params.get("commit_every", 10000))
+    # optional record cap per txn; 0/unset commits on size and age only
+    commit_every = int(params.get("commit_every") or 0) or sys.maxsize
+    commit_bytes = int(params.get("commit_mb", 64)) << 20
+    commit_seconds = float(params.get("commit_seconds", 0.5))
+    commit_per_file = bool(params.get("commit_per_file", False))
+    processes    = int(params.get("processes", 1))
     lmdb_map_gb  = int(params.get("lmdb_map_gb", 64))
+    lmdb_bulk_load = bool(params.get("lmdb_bulk_load", True))
+    write_buffer = int(params.get("write_buffer", 65536))
 
     if not hosters_file:
         raise ValueError("pipeline.yaml missing 'hosters_file'")
@@ -110,55 +411,53 @@ def ingest_and_export(config_path: str) -> None:
     if not feeds_conf:
         raise ValueError("pipeline.yaml missing 'feeds_file'")
 
+    # Carry forward Step 4 capacity (preferred universe for output rows).
+    # Only needed for the export, so load it in the background meanwhile
+    # (or, while Step 4 is still running, once it is done). No on-disk
+    # cache: in run_pipeline Step 4 rewrites the file right before this.
+    capacity_csv = outputs.get("capacity_csv", "")
+    load_capacity = functools.partial(_load_capacity_map, capacity_csv)  # normalized names
+    capacity_future = None
+    if capacity_ready is None:
+        loader = ThreadPoolExecutor(max_workers=1)
+        capacity_future = loader.submit(load_capacity)
+        loader.shutdown(wait=False)
+
+    def capacity_and_names():
+        if capacity_future is not None:
+            capacity_map = capacity_future.result()
+        else:
+            capacity_ready.result()  # re-raises a Step 4 failure
+            capacity_map = load_capacity()
+        # Prefer the capacity universe for output rows (ensures totals even with zero feeds);
+        # fallback: use hosters if capacity missing (dict keys are already unique)
+        return capacity_map, sorted(capacity_map or hosters)
+
     # Load hosters → [cidrs...] and normalize their names
     logger.info("Step 5: loading hosters...")
-    loaded = load_hosters(hosters_file)
-    if isinstance(loaded, tuple):
-        hosters_raw, _meta = loaded
-    else:
-        hosters_raw, _meta = loaded, {}
-
-    hosters: Dict[str, List[str]] = {
-        normalize_name(k): v for k, v in hosters_raw.items()
-    }
-    all_hoster_names = list(hosters.keys())
-
-    # Carry forward Step 4 capacity (preferred universe for output rows)
-    capacity_csv = outputs.get("capacity_csv", "")
-    capacity_map = _load_capacity_map(capacity_csv)  # normalized names
+    hosters: Dict[str, List[str]] = _cached_by_stat(
+        os.path.join(lmdb_dir, HOSTERS_SIDECAR), hosters_file,
+        functools.partial(_load_hosters_normalized, hosters_file),
+    )
+    # Step 5 is the last user of load_hosters(): free its cached raw dicts
+    # before the parse workers are started
+    load_hosters.cache_clear()
 
     # Optional: build domain->org map from Step 2 triplets (for domain-only feeds)
     # (kept for future use; safe no-op if not used by your parsers)
     domain_map: Dict[str, str] = {}
     step2_dir = paths.get("step2_out_dir")
     if step2_dir and os.path.isdir(step2_dir):
-        built = 0
         try:
-            for name in os.listdir(step2_dir):
-                if not name.startswith("step3_enriched_") or not name.endswith(".txt"):
-                    continue
-                with open(os.path.join(step2_dir, name), "r", encoding="utf-8") as fh:
-                    for line in fh:
-                        # format: "sld | ip | org"
-                        parts = [p.strip() for p in line.split("|")]
-                        if len(parts) < 3:
-                            continue
-                        sld = parts[0]
-                        org = normalize_name(parts[2])
-                        if not sld or not org:
-                            continue
-                        if sld not in domain_map:
-                            domain_map[sld] = org
-                            built += 1
-            if built:
-                logger.info(f"Step 5: built {built} sld->org mappings from Step 2 outputs")
+            domain_map = _build_sld_org_from_step2(step2_dir)
+            if domain_map:
+                logger.info(f"Step 5: built {len(domain_map)} sld->org mappings from Step 2 outputs")
         except Exception as e:
             logger.warning(f"Step 5: failed building domain map from Step 2: {e}")
 
     # Load feeds list
     logger.info("Step 5: loading feeds...")
-    with open(feeds_conf, "r", encoding="utf-8") as fh:
-        feeds_yaml = yaml.safe_load(fh) or {}
+    feeds_yaml = _load_yaml(feeds_conf)
     feeds_list = feeds_yaml.get("feeds", []) or []
 
     feed_specs: List[Tuple[str, str]] = []
@@ -174,39 +473,89 @@ def ingest_and_export(config_path: str) -> None:
         feed_specs.append((name, path))
         feeds_to_report.append(name)
 
+    # join before the parse pool forks: no thread may be mid-IO at fork time
+    if capacity_future is not None:
+        capacity_future.result()
+
+    if not feed_specs:
+        # capacity-only run: nothing to count, so never touch LMDB
+        logger.info("Step 5: no registered feeds; writing capacity-only CSV")
+        capacity_map, output_names = capacity_and_names()
+        _write_counts_csv(output_csv, [], output_names, capacity_map, {}, ({}, {}, {}, {}))
+        logger.info(f"Wrote {output_csv}")
+        return
+
     # Prepare store & processor
     logger.info("Step 5: opening LMDB...")
-    store = Store(lmdb_dir, map_size_gb=lmdb_map_gb)
-    # Processor(hosters, store, feed_policy) in your current code; if your Processor
-    # takes only (hosters, store), this call still works by ignoring domain_map.
-    # We pass an empty feed policy here (all IP-only feeds), but you can extend later.
-    try:
-        proc = Processor(hosters, store, {})
-    except TypeError:
-        # fallback for older signature Processor(hosters, store)
-        proc = Processor(hosters, store)
-
-    # Ingest feeds
-    logger.info("Step 5: ingesting feeds...")
-    n = 0
+    store = Store(lmdb_dir, map_size_gb=lmdb_map_gb, bulk_load=lmdb_bulk_load)
+    store.clear()  # counts are rebuilt from the feeds on every run
+    # Domains are only counted for feeds whose parser declares a reliable domain signal
+    feed_policy = {
+        name: bool(getattr(FEED_REGISTRY[name], "COUNT_DOMAINS", False))
+        for name in feeds_to_report
+    }
+    proc = Processor(hosters, store, feed_policy, flush_every=write_buffer)
+
+    # Ingest feeds: when processes > 1, worker processes parse files (of all
+    # feeds, drained as they complete) and resolve IP owners; LMDB writes
+    # stay in this process (single writer).
+    # Self-clocking group commit: the write txn is committed once it holds
+    # `commit_mb` of data or is `commit_seconds` old, whichever comes first
+    # (checked every _COMMIT_CHECK records), plus after `commit_every`
+    # records if set (and per file if configured).
+    logger.info(f"Step 5: ingesting feeds with {processes} process(es)...")
+    if processes > 1:
+        pool = ProcessPoolExecutor(
+            max_workers=processes, initializer=_init_worker, initargs=(hosters,)
+        )
+    else:
+        pool = nullcontext()
+
     txn = store.env.begin(write=True)
+    left = commit_every  # records until the next forced commit
+    committed_bytes = proc.flushed_bytes
+    last_commit = time.monotonic()
+
+    def commit():
+        nonlocal txn, left, committed_bytes, last_commit
+        proc.flush(txn)
+        txn.commit()
+        txn = store.env.begin(write=True)
+        left = commit_every
+        committed_bytes = proc.flushed_bytes
+        last_commit = time.monotonic()
+
+    jobs = []
     for feed_name, path in feed_specs:
-        parser_entry = FEED_REGISTRY[feed_name]
-        parser = parser_entry() if callable(parser_entry) else parser_entry
         files = _expand_files(path)
         logger.info(f"[{feed_name}] Found {len(files)} files matching {path}")
-        for f in files:
+        jobs += [(feed_name, f) for f in files]
+
+    with pool as ex:
+        if ex is None:
+            batches = _serial_batches(jobs, proc.index)
+        else:
+            batches = _pooled_batches(ex, jobs, 2 * processes)
+        for feed_name, f, records in batches:
             logger.info(f"[{feed_name}] Processing {f}")
-            try:
-                for rec in parser.iter_records(f):
-                    # normalize hoster via CIDR or domain mapping happens inside Processor/Store
-                    proc.ingest_record(rec, txn)
-                    n += 1
-                    if n % commit_every == 0:
-                        txn.commit()
-                        txn = store.env.begin(write=True)
-            except Exception as e:
-                logger.warning(f"Error in {f}: {e}")
+            ingest = proc.ingester(feed_name)  # specialised for this feed's policy
+            # hand the records over in slices, checking the commit policy between them
+            it = iter(records)
+            while True:
+                want = min(left, _COMMIT_CHECK)
+                got = ingest(islice(it, want), txn)
+                left -= got
+                if (
+                    left == 0
+                    or proc.flushed_bytes - committed_bytes >= commit_bytes
+                    or time.monotonic() - last_commit >= commit_seconds
+                ):
+                    commit()
+                if got < want:
+                    break  # file exhausted
+            if commit_per_file:
+                commit()
+    proc.flush(txn)
     txn.commit()
 
     logger.info("Step 5: finalizing shared IPs...")
@@ -216,18 +565,15 @@ def ingest_and_export(config_path: str) -> None:
 
     logger.info("Step 5: generating output CSV...")
 
-    header = ["hoster"]
-    for feed in feeds_to_report:
-        header.append(f"{feed}_ips")
-    header += ["domaincount_seen", "ipcount_seen", "ipcount_shared", "domaincount_shared"]
-    cap_cols = ["domaincount", "cidr_count", "total_ips", "avg_domains_per_ip", "cidrs"]
-    header += cap_cols
-
     # Per-feed IP counts grouped by (hoster, feed)
     try:
         perfeed_ips = store.count_dups_grouped_hoster_source(store.db_hoster_src_ips)
     except Exception:
         perfeed_ips = {}
+    # bucket by hoster once so the row loop needs no (hoster, feed) tuple keys
+    perfeed_by_hoster: Dict[str, Dict[str, int]] = {}
+    for (h, src), c in perfeed_ips.items():
+        perfeed_by_hoster.setdefault(h, {})[src] = c
 
     # Overall seen/shared
     try:
@@ -245,38 +591,11 @@ def ingest_and_export(config_path: str) -> None:
 
     ipcount_shared_map = getattr(proc, "ipcount_shared", {})
 
-    # Prefer the capacity universe for output rows (ensures totals even with zero feeds)
-    if capacity_map:
-        output_names = sorted(capacity_map.keys())
-    else:
-        # fallback: use hosters if capacity missing
-        output_names = sorted(set(all_hoster_names))
-
-    with open(output_csv, "w", newline="", encoding="utf-8") as outfh:
-        w = csv.writer(outfh)
-        w.writerow(header)
-
-        for hoster in output_names:
-            row = [hoster]
-
-            # feed columns (zeros if none)
-            for feed in feeds_to_report:
-                row.append(str(perfeed_ips.get((hoster, feed), 0)))
-
-            # store summary (zeros if none)
-            dcs = domaincount_seen.get(hoster, 0)
-            ips = ipcount_seen.get(hoster, 0)
-            ipsh = ipcount_shared_map.get(hoster, 0)
-            dsh = domaincount_shared.get(hoster, 0)
-            row.extend([str(dcs), str(ips), str(ipsh), str(dsh)])
-
-            # capacity carry-forward (always filled for capacity universe)
-            cap = capacity_map.get(hoster, {})
-            for c in cap_cols:
-                row.append(str(cap.get(c, "")))
-
-            w.writerow(row)
-
+    capacity_map, output_names = capacity_and_names()
+    _write_counts_csv(
+        output_csv, feeds_to_report, output_names, capacity_map, perfeed_by_hoster,
+        (domaincount_seen, ipcount_seen, ipcount_shared_map, domaincount_shared),
+    )
     logger.info(f"Wrote {output_csv}")
     store.close()
 
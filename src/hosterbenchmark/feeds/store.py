@@ -1,86 +1,333 @@
 import lmdb
+import pytricia
+import functools
 from collections import defaultdict
-import ipaddress
+import socket
+import sys
+
+# Separates hoster and feed name in composite keys
+KEY_SEP = "\x00"
+
+
+def pack_ip(ip: str) -> bytes:
+    """IP as stored in LMDB: 4 bytes (IPv4) or 16 bytes (IPv6), network order."""
+    try:
+        return socket.inet_pton(socket.AF_INET6 if ":" in ip else socket.AF_INET, ip)
+    except (OSError, ValueError):
+        return ip.encode("utf-8", "replace")  # keep odd spellings rather than drop them
+
 
 class Store:
-    def __init__(self, path, map_size_gb=64):
+    """
+    LMDB environment with one DUPSORT sub-database per counted relation.
+
+    Keys are UTF-8 hoster names ("<hoster>\\x00<feed>" for per-feed sets),
+    values the member: a packed IP (see pack_ip) or a UTF-8 domain. DUPSORT
+    keeps each key/value pair once, so the number of duplicates under a key
+    is the number of distinct members.
+    """
+
+    def __init__(self, path, map_size_gb=64, bulk_load=True):
+        # bulk_load (default): write through a writable mmap and skip the
+        # per-commit fsyncs; close() syncs once. The store is a cache rebuilt
+        # from the feeds on every run, so relaxed durability is fine: after a
+        # crash mid-ingest just re-run the step (on a fresh lmdb_dir if the
+        # env no longer opens). bulk_load=False gives LMDB's default fsyncs.
         self.env = lmdb.open(
             path,
             map_size=map_size_gb * 1024 ** 3,
             subdir=True,
-            max_dbs=1,
+            max_dbs=4,
             readonly=False,
             lock=True,
             readahead=False,
-            meminit=False
+            meminit=False,
+            writemap=bulk_load,
+            metasync=not bulk_load,
+            sync=not bulk_load,
+            map_async=bulk_load,
         )
+        self.db_hoster_ips = self.env.open_db(b"hoster_ips", dupsort=True)
+        self.db_hoster_src_ips = self.env.open_db(b"hoster_src_ips", dupsort=True)
+        self.db_hoster_domains = self.env.open_db(b"hoster_domains", dupsort=True)
+        self.db_hoster_domains_sh = self.env.open_db(b"hoster_domains_sh", dupsort=True)
+
+    def clear(self):
+        """Empty all sub-databases (the store is rebuilt on every run)."""
+        with self.env.begin(write=True) as txn:
+            for db in (self.db_hoster_ips, self.db_hoster_src_ips,
+                       self.db_hoster_domains, self.db_hoster_domains_sh):
+                txn.drop(db, delete=False)
+
+    def count_dups(self, db):
+        """Return {key: number of distinct values} for a DUPSORT db."""
+        out = {}
+        with self.env.begin(db=db) as txn:
+            cur = txn.cursor()
+            more = cur.first()
+            while more:
+                out[bytes(cur.key()).decode("utf-8")] = cur.count()
+                more = cur.next_nodup()
+        return out
+
+    def count_dups_grouped_hoster_source(self, db):
+        """Like count_dups() for "<hoster>\\x00<feed>" keys, keyed by (hoster, feed)."""
+        return {
+            tuple(k.split(KEY_SEP, 1)): v
+            for k, v in self.count_dups(db).items()
+            if KEY_SEP in k
+        }
+
+    def sync(self):
+        """Flush everything to disk (close() does this too)."""
+        self.env.sync(True)
 
     def close(self):
+        self.sync()
         self.env.close()
 
 
+class HosterIndex:
+    """
+    Maps an IP to the hoster whose CIDRs contain it ("UNKNOWN" if none).
+
+    One pytricia trie per address family (C-level longest-prefix match);
+    no ipaddress parsing on the lookup path.
+    """
+
+    def __init__(self, hosters, cache_size=1_000_000):
+        self.hosters = hosters  # dict[str, list[str]]
+        # feeds repeat the same IPs a lot: memoize lookups per index
+        self.owner = functools.lru_cache(maxsize=cache_size)(self._lookup)
+        self._v4 = pytricia.PyTricia(32)
+        self._v6 = pytricia.PyTricia(128)
+        for org, prefixes in hosters.items():
+            for prefix in prefixes:
+                # pytricia does not reject the other family's prefixes: route by ':'
+                trie = self._v6 if ":" in prefix else self._v4
+                try:
+                    if not trie.has_key(prefix):  # first hoster listing a prefix keeps it
+                        trie[prefix] = org
+                except (ValueError, KeyError):
+                    continue
+
+    def _lookup(self, ip: str) -> str:
+        try:
+            return (self._v6 if ":" in ip else self._v4).get(ip, "UNKNOWN")
+        except ValueError:
+            return "UNKNOWN"
+
+    def owned(self, ips):
+        """[(owner, ip), ...] for the IPs that belong to a known hoster."""
+        out = []
+        lookup = self.owner
+        for ip in ips:
+            owner = lookup(ip)
+            if owner != "UNKNOWN":
+                out.append((owner, ip))
+        return out
+
+
 class Processor:
-    def __init__(self, hosters, store, feed_policy):
+    """
+    Turns feed records into LMDB writes. Pairs are staged in memory and
+    written in sorted key order by flush() (every `flush_every` hits, and
+    by the caller before each commit), so each flush walks the B-tree leaf
+    pages front to back instead of hopping between hosters.
+    """
+
+    def __init__(self, hosters, store, feed_policy, flush_every=65536):
         self.hosters = hosters  # dict[str, list[str]]
+        self.index = HosterIndex(hosters)
         self.store = store
-        self.feed_policy = feed_policy
+        self.feed_policy = feed_policy  # feed -> count domains?
+        self.flush_every = flush_every
 
-        self.seen = defaultdict(lambda: defaultdict(set))   # hoster → feed → set(ip or domain)
+        # IP sets hold the packed 4/16-byte form from pack_ip (a fraction of
+        # the dotted text's size, cheaper to hash), domain sets the str
+        self.seen = {}                                      # (hoster, "<feed>_ips"|"<feed>_domains") → set
         self.shared = defaultdict(set)                      # hoster → set(shared ips)
 
-    def _find_owner(self, ip: str) -> str:
-        try:
-            ip_obj = ipaddress.ip_address(ip)
-        except ValueError:
-            return "UNKNOWN"
-        for org, prefixes in self.hosters.items():
-            for prefix in prefixes:
-                try:
-                    if ip_obj in ipaddress.ip_network(prefix):
-                        return org
-                except Exception:
-                    continue
-        return "UNKNOWN"
+        # write cursors, re-bound whenever a new transaction is passed in
+        self._txn = None
+        self._cur_ips = self._cur_src_ips = self._cur_domains = None
+
+        # staged (key, value) pairs per sub-db; sets also drop repeats early
+        self._pending_ips = set()
+        self._pending_src_ips = set()
+        self._pending_domains = set()
+        self._npending = 0
+        self.flushed_bytes = 0  # key+value bytes handed to LMDB so far
+
+        # encoded LMDB keys, built once per hoster (and per hoster/feed pair)
+        self._hkeys = {}      # hoster -> b"<hoster>"
+        self._src_keys = {}   # feed -> {hoster -> b"<hoster>\x00<feed>"}
+        self._ingesters = {}  # feed -> specialised ingest closure, see ingester()
+        # seen-key tags per feed, interned once (no per-record/per-row formatting)
+        self._feed_tags = {feed: self._make_tags(feed) for feed in feed_policy}
+
+    @staticmethod
+    def _make_tags(feed):
+        return sys.intern(f"{feed}_ips"), sys.intern(f"{feed}_domains")
+
+    def _tags(self, feed):
+        """(ips_tag, domains_tag) used as the second half of self.seen keys."""
+        tags = self._feed_tags.get(feed)
+        if tags is None:
+            tags = self._feed_tags[feed] = self._make_tags(feed)
+        return tags
+
+    def _bind(self, txn):
+        self._txn = txn
+        self._cur_ips = txn.cursor(self.store.db_hoster_ips)
+        self._cur_src_ips = txn.cursor(self.store.db_hoster_src_ips)
+        self._cur_domains = txn.cursor(self.store.db_hoster_domains)
 
     def ingest_record(self, record, txn):
         """
-        record: dict with at least 'feed', 'ip', and optionally 'domain'
+        record: parser FeedRecord (domain, ips, timestamp, source), see
+        BaseFeedParser.iter_records. Writes are staged; see flush().
         """
-        ip = record.get("ip")
-        domain = record.get("domain")
-        feed = record.get("feed")
-        if not ip or not feed:
+        domain, ips, _ts, feed = record
+        if not ips or not feed:
             return
+        self.ingester(feed)(((domain, self.index.owned(ips)),), txn)
 
-        owner = self._find_owner(ip)
-        if owner == "UNKNOWN":
-            return
+    def ingester(self, feed):
+        """
+        Return ingest(records, txn) -> int specialised for one feed. records
+        is an iterable of (domain, [(owner, ip), ...]) with owners already
+        resolved (HosterIndex.owned); the return value is how many were
+        consumed. The loop runs inside the closure, with the feed's domain
+        policy, tags and key cache bound once, so there is no per-record
+        call, policy lookup or domain branch.
+        """
+        ing = self._ingesters.get(feed)
+        if ing is not None:
+            return ing
+
+        hkeys = self._hkeys
+        src_keys = self._src_keys.setdefault(feed, {})
+        seen = self.seen
+        ips_tag, domains_tag = self._tags(feed)
+        count_domains = self.feed_policy.get(feed, True)
+        add_ip = self._pending_ips.add
+        add_src_ip = self._pending_src_ips.add
+        add_domain = self._pending_domains.add
+        flush_every = self.flush_every
 
-        if self.feed_policy.get(feed, True):  # domain counting enabled
-            if domain:
-                self.seen[owner][f"{feed}_domains"].add(domain)
-        self.seen[owner][f"{feed}_ips"].add(ip)
+        # per-owner slot for this feed: encoded keys plus this feed's seen
+        # sets (the same set objects as in self.seen), one dict hop per hit
+        slots = {}
+
+        def _slot(owner):
+            hkey = hkeys.get(owner)
+            if hkey is None:
+                hkey = hkeys[owner] = owner.encode("utf-8")
+            skey = src_keys.get(owner)
+            if skey is None:
+                skey = src_keys[owner] = f"{owner}{KEY_SEP}{feed}".encode("utf-8")
+            ip_set = seen.setdefault((owner, ips_tag), set())
+            domain_set = seen.setdefault((owner, domains_tag), set()) if count_domains else None
+            slot = slots[owner] = (hkey, skey, ip_set, domain_set)
+            return slot
+
+        if count_domains:
+            def ing(records, txn):
+                n = 0
+                for domain, hits in records:
+                    n += 1
+                    dval = domain.encode("utf-8") if domain else None
+                    for owner, ip in hits:
+                        hkey, skey, ip_set, domain_set = slots.get(owner) or _slot(owner)
+                        ival = pack_ip(ip)
+                        add_ip((hkey, ival))
+                        add_src_ip((skey, ival))
+                        ip_set.add(ival)
+                        if dval:
+                            add_domain((hkey, dval))
+                            domain_set.add(domain)
+                    self._npending += len(hits)
+                    if self._npending >= flush_every:
+                        self.flush(txn)
+                return n
+        else:
+            def ing(records, txn):  # IP-only feed: domains are ignored
+                n = 0
+                for _domain, hits in records:
+                    n += 1
+                    for owner, ip in hits:
+                        hkey, skey, ip_set, _ = slots.get(owner) or _slot(owner)
+                        ival = pack_ip(ip)
+                        add_ip((hkey, ival))
+                        add_src_ip((skey, ival))
+                        ip_set.add(ival)
+                    self._npending += len(hits)
+                    if self._npending >= flush_every:
+                        self.flush(txn)
+                return n
+
+        self._ingesters[feed] = ing
+        return ing
+
+    def flush(self, txn):
+        """Write all staged pairs into txn in key order (call before committing it)."""
+        if txn is not self._txn:
+            self._bind(txn)
+        for cur, pending in (
+            (self._cur_ips, self._pending_ips),
+            (self._cur_src_ips, self._pending_src_ips),
+            (self._cur_domains, self._pending_domains),
+        ):
+            if pending:
+                batch = sorted(pending)
+                self.flushed_bytes += sum(len(k) + len(v) for k, v in batch)
+                # one C call per sub-db instead of one put() per pair
+                cur.putmulti(batch, dupdata=True)
+                pending.clear()
+        self._npending = 0
 
     def finalize_shared(self):
         # Simple placeholder – extend if needed
         pass
 
     def results(self, hoster_list, feeds_to_report, feed_policy):
+        seen = self.seen
+        empty = frozenset()
+        # all IPs per reported hoster across feeds, unioned in one pass over
+        # seen; a hoster's first set is borrowed and only copied once a
+        # second feed has to be merged into it (seen itself is never mutated)
+        wanted = set(hoster_list)
+        all_ips = {}
+        borrowed = set()
+        for (hoster, tag), members in seen.items():
+            if hoster not in wanted or not tag.endswith("_ips"):
+                continue
+            acc = all_ips.get(hoster)
+            if acc is None:
+                all_ips[hoster] = members
+                borrowed.add(hoster)
+            else:
+                if hoster in borrowed:
+                    acc = all_ips[hoster] = set(acc)
+                    borrowed.discard(hoster)
+                acc |= members
+
+        tags = [(feed, self._tags(feed)) for feed in feeds_to_report]
         rows = []
         for hoster in hoster_list:
             row = [hoster]
-            for feed in feeds_to_report:
+            for feed, (ips_tag, domains_tag) in tags:
+                i_count = len(seen.get((hoster, ips_tag), empty))
                 if feed_policy.get(feed, True):
-                    d_count = len(self.seen[hoster].get(f"{feed}_domains", set()))
-                    i_count = len(self.seen[hoster].get(f"{feed}_ips", set()))
+                    d_count = len(seen.get((hoster, domains_tag), empty))
                     row += [d_count, i_count]
                 else:
-                    i_count = len(self.seen[hoster].get(f"{feed}_ips", set()))
                     row += [i_count]
             # Placeholder columns
             row += [
                 0,  # domaincount_seen
-                len(set().union(*[self.seen[hoster][k] for k in self.seen[hoster] if k.endswith("_ips")])),
+                len(all_ips.get(hoster, empty)),
                 0,  # ipcount_shared
                 0   # domaincount_shared
             ]
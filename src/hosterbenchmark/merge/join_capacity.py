@@ -8,24 +8,37 @@ Inputs (from pipeline.yaml):
 
 Output:
   - outputs.merged_csv
+
+Both inputs hold one row per hoster (Steps 4/5 aggregate everything
+upstream), so they are joined in memory; their size grows with the number
+of hosters and feeds, not with the DNS or feed volume.
 """
 
 from __future__ import annotations
 import os
+import decimal
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import Union, Dict, Any
+import numpy as np
 import pandas as pd
 
 try:
     import yaml
+    # libyaml-backed loader when PyYAML was built with it
+    _YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 except Exception:
     yaml = None
 
+from hosterbenchmark.feeds.parsers import prefetch, read_csv_arrow
+
 logger = logging.getLogger("hosterbenchmark.step6")
 logger.setLevel(logging.INFO)
-_handler = logging.StreamHandler()
-_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s: %(message)s"))
-logger.addHandler(_handler)
+if not logger.handlers:  # a re-import/reload must not stack a second handler
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s: %(message)s"))
+    logger.addHandler(_handler)
+logger.propagate = False  # own handler only: no second copy via a configured root logger
 
 
 # ---------------------------------------------------------------------
@@ -46,17 +59,106 @@ def _load_cfg(config_path_or_dict: Union[str, Dict[str, Any]]) -> Dict[str, Any]
         raise FileNotFoundError(f"pipeline.yaml not found: {config_path_or_dict}")
 
     with open(config_path_or_dict, "r", encoding="utf-8") as fh:
-        cfg = yaml.safe_load(fh) or {}
+        cfg = yaml.load(fh, Loader=_YamlLoader) or {}
     return cfg
 
 
+def _read_table(path: str) -> pd.DataFrame:
+    """
+    Read a Step 4/5 table (CSV, or Parquet by extension) with every cell as
+    text (no type inference, blanks stay ""), so values are written back
+    verbatim. Arrow's CSV parser when pyarrow is installed. Whether the
+    text columns then stay Arrow-backed depends on pandas' default string
+    dtype: pyarrow string storage on pandas >= 3 (no per-cell Python
+    object to build), object columns of str on older pandas.
+    """
+    if path.endswith(".parquet"):
+        df = pd.read_parquet(path)
+        return df.astype(str).where(df.notna(), "")
+    table = read_csv_arrow(path, as_text=True)
+    if table is not None:
+        return table.to_pandas()
+    return pd.read_csv(path, dtype=str, na_filter=False)
+
+
+def _typed_column(s: pd.Series) -> pd.Series:
+    """
+    A text column as Parquet should store it: nullable integers when every
+    non-empty cell is an integer (decimal256 past int64, as in Step 4),
+    nullable floats when every one is a number, else the text unchanged.
+    Empty cells become nulls in numeric columns.
+    """
+    blank = s == ""
+    if blank.all():
+        return s
+    filled = s[~blank]
+    if filled.str.fullmatch(r"[+-]?\d+").all():
+        ints = [None if v == "" else int(v) for v in s]
+        present = [v for v in ints if v is not None]
+        if -(1 << 63) <= min(present) and max(present) < (1 << 63):
+            return pd.Series(pd.array(ints, dtype="Int64"), index=s.index)
+        import pyarrow  # to_parquet needs it anyway
+        return pd.Series(pd.array(
+            [None if v is None else decimal.Decimal(v) for v in ints],
+            dtype=pd.ArrowDtype(pyarrow.decimal256(76, 0)),
+        ), index=s.index)
+    nums = pd.to_numeric(s.mask(blank), errors="coerce")
+    if (nums.notna() == ~blank).all():
+        return nums.astype("Float64")
+    return s
+
+
+def _write_table(df: pd.DataFrame, path: str) -> None:
+    """
+    Write CSV (gzip-compressed when `path` ends in .gz), or zstd-compressed
+    Parquet when it ends in .parquet (count columns typed, not text).
+    """
+    if path.endswith(".parquet"):
+        df = pd.DataFrame({
+            c: df[c] if c == "Organization" else _typed_column(df[c]) for c in df.columns
+        })
+        df.to_parquet(path, compression="zstd", index=False)
+        return
+    if path.endswith(".gz"):
+        df.to_csv(path, index=False, compression={"method": "gzip", "compresslevel": 6})
+        return
+    # 1 MiB write buffer instead of the 8 KiB default, as in Step 5
+    with open(path, "w", newline="", encoding="utf-8", buffering=1 << 20) as fh:
+        df.to_csv(fh, index=False)
+
+
 def _normalize_join_key(df: pd.DataFrame) -> pd.DataFrame:
     """Ensure both inputs join on 'Organization'."""
     if "Organization" not in df.columns and "hoster" in df.columns:
-        df = df.rename(columns={"hoster": "Organization"})
+        # relabel in place: no new frame just to change one column name
+        df.columns = ["Organization" if c == "hoster" else c for c in df.columns]
     return df
 
 
+def _redundant_columns(cap_df: pd.DataFrame, feed_df: pd.DataFrame, common: list) -> list:
+    """
+    Columns of `common` whose feed copy matches the capacity copy for every
+    Organization of the outer join (missing counts as empty), i.e. the _y
+    twins the merge would produce only to drop them again.
+    """
+    if not common:
+        return []
+    left = cap_df.set_index("Organization")[common]
+    right = feed_df.set_index("Organization")[common]
+    if not (left.index.is_unique and right.index.is_unique):
+        return []  # merge(validate=...) reports this
+    idx = left.index.union(right.index)
+    left = left.reindex(idx, fill_value="").to_numpy()
+    right = right.reindex(idx, fill_value="").to_numpy()
+    # columns that differ usually do so from the first rows on: rule those
+    # out on a small head before comparing whole columns
+    cand = np.flatnonzero((left[:8] == right[:8]).all(axis=0))
+    # one elementwise pass over the remaining columns (cells are text and
+    # missing ones "", so no NaN handling needed)
+    equal = (left[:, cand] == right[:, cand]).all(axis=0)
+    return [common[i] for i, same in zip(cand, equal) if same]
+
+
 # ---------------------------------------------------------------------
 # Main
 # ---------------------------------------------------------------------
@@ -82,8 +184,17 @@ def merge_counts(config_path_or_dict: Union[str, Dict[str, Any]]) -> None:
         raise FileNotFoundError(f"Missing feed file: {feed_path}")
 
     logger.info(f"Step 6: reading {cap_path} and {feed_path}")
-    cap_df = pd.read_csv(cap_path)
-    feed_df = pd.read_csv(feed_path)
+    # Step 6 only joins and compares cells, so they are read as text
+    # (integer columns are not turned into floats by the outer join)
+    # start read-ahead on both files before parsing either
+    prefetch(cap_path)
+    prefetch(feed_path)
+    # the parsers release the GIL: read capacity in a helper thread while
+    # this one reads the feed counts
+    with ThreadPoolExecutor(max_workers=1) as ex:
+        cap_future = ex.submit(_read_table, cap_path)
+        feed_df = _read_table(feed_path)
+        cap_df = cap_future.result()
 
     cap_df = _normalize_join_key(cap_df)
     feed_df = _normalize_join_key(feed_df)
@@ -91,41 +202,64 @@ def merge_counts(config_path_or_dict: Union[str, Dict[str, Any]]) -> None:
     if "Organization" not in cap_df.columns or "Organization" not in feed_df.columns:
         raise ValueError("Neither input contains 'Organization' (or 'hoster') to join on.")
 
-    merged = pd.merge(cap_df, feed_df, on="Organization", how="outer", suffixes=("_x", "_y"))
-
-    # Drop redundant identical *_y columns; keep *_x and rename it back
-    to_drop = []
+    # Step 5 carries the capacity columns forward: drop the identical feed
+    # copies before the join instead of hashing/copying them into _y twins
+    cap_cols = set(cap_df.columns)
+    common = [c for c in feed_df.columns if c != "Organization" and c in cap_cols]
+    redundant = _redundant_columns(cap_df, feed_df, common)
+    if redundant:
+        logger.info(f"Dropping {len(redundant)} redundant identical columns: {', '.join(redundant[:6])}{'...' if len(redundant)>6 else ''}")
+        feed_df = feed_df.drop(columns=redundant)
+
+    # join on shared categorical codes (ints) instead of hashing the names;
+    # sorted categories keep the outer join's lexicographic row order
+    orgs = pd.Index(sorted(set(cap_df["Organization"]).union(feed_df["Organization"])))
+    cap_df["Organization"] = pd.Categorical(cap_df["Organization"], categories=orgs)
+    feed_df["Organization"] = pd.Categorical(feed_df["Organization"], categories=orgs)
+
+    merged = pd.merge(
+        cap_df, feed_df, on="Organization", how="outer", sort=False,
+        suffixes=("_x", "_y"), validate="one_to_one",
+    )
+    # the categorical key was only for the join: plain strings in the output
+    merged["Organization"] = merged["Organization"].astype(str)
+    # rows missing on one side read as empty cells, like blanks in the inputs
+    merged.fillna("", inplace=True)
+    del cap_df, feed_df  # only the merged frame is needed from here on
+
+    # Identical twins were dropped before the join; the remaining _x/_y
+    # pairs differ and are both kept. Lone _x columns get their name back.
     to_rename = {}
-    for col in merged.columns:
-        if col.endswith("_x"):
-            base = col[:-2]
-            twin = base + "_y"
-            if twin in merged.columns:
-                if merged[col].equals(merged[twin]):
-                    to_drop.append(twin)
-                    to_rename[col] = base  # rename the kept _x column back to original
-                else:
-                    logger.warning(f"Column '{base}' differs between capacity and feeds; keeping both")
-            else:
-                # no twin, rename to base anyway for clarity
-                to_rename[col] = base
-
-    if to_drop:
-        logger.info(f"Dropping {len(to_drop)} redundant identical columns: {', '.join(to_drop[:6])}{'...' if len(to_drop)>6 else ''}")
-        merged.drop(columns=to_drop, inplace=True)
-
-    if to_rename:
-        merged.rename(columns=to_rename, inplace=True)
+    col_set = set(merged.columns)
+    for col in [c for c in merged.columns if c.endswith("_x")]:
+        base = col[:-2]
+        if base + "_y" in col_set:
+            logger.warning(f"Column '{base}' differs between capacity and feeds; keeping both")
+        else:
+            # no twin, rename to base anyway for clarity
+            to_rename[col] = base
+
+    names = [to_rename.get(c, c) for c in merged.columns]
 
     # Final cleanup: drop any lingering '_y' columns that were unmatched but empty
-    y_cols = [c for c in merged.columns if c.endswith("_y") and merged[c].isna().all()]
-    if y_cols:
-        logger.info(f"Dropping empty trailing columns: {', '.join(y_cols)}")
-        merged.drop(columns=y_cols, inplace=True)
+    # (one numpy pass over the _y block, no boolean Series per column)
+    y_pos = [i for i, c in enumerate(names) if c.endswith("_y")]
+    if y_pos:
+        empty = (merged.iloc[:, y_pos].to_numpy() == "").all(axis=0)
+        y_pos = [i for i, e in zip(y_pos, empty) if e]
+    if y_pos:
+        logger.info(f"Dropping empty trailing columns: {', '.join(names[i] for i in y_pos)}")
+
+    # drop and rename in one column selection instead of drop() + rename()
+    if y_pos or to_rename:
+        dropped = set(y_pos)
+        keep = [i for i in range(len(names)) if i not in dropped]
+        merged = merged.iloc[:, keep]
+        merged.columns = [names[i] for i in keep]
 
     # Write output
     os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
-    merged.to_csv(out_path, index=False)
+    _write_table(merged, out_path)
     logger.info(f"Step 6: wrote {out_path} ({len(merged)} rows, {len(merged.columns)} columns)")
 
 
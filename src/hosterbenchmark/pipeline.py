@@ -1,3 +1,10 @@
+import multiprocessing
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
 from hosterbenchmark.domains.extract import extract_dnsdb
 from hosterbenchmark.domains.enrich import enrich_pairs
 from hosterbenchmark.counts.unique_slds import count_unique_slds
@@ -5,12 +12,50 @@ from hosterbenchmark.counts.capacity import compute_capacity
 from hosterbenchmark.feeds.runner import ingest_and_export
 from hosterbenchmark.merge.join_capacity import merge_counts
 
+def _capacity_branch(cfg):
+    """Steps 3 and 4 (Step 2 outputs -> capacity table)."""
+    count_unique_slds(cfg)
+    compute_capacity(cfg)
+
+class _CapacityBranch:
+    """
+    Steps 3-4 in a child process. A plain Process rather than an executor:
+    it leaves no helper thread behind in this process, which Step 5 forks
+    for its parse pool. result() waits and raises if the branch failed
+    (the future-like interface ingest_and_export expects).
+    """
+
+    def __init__(self, cfg):
+        self._proc = multiprocessing.Process(
+            target=_capacity_branch, args=(cfg,), name="hb-capacity"
+        )
+        self._proc.start()
+
+    def join(self):
+        self._proc.join()
+
+    def result(self):
+        self.join()
+        if self._proc.exitcode != 0:
+            raise RuntimeError(f"Steps 3-4 failed (exit code {self._proc.exitcode})")
+
 def run_pipeline(config_path: str):
     print("[*] Starting full HosterBenchmark pipeline")
-    extract_dnsdb(config_path)
-    enrich_pairs(config_path)
-    count_unique_slds(config_path)
-    compute_capacity(config_path)
-    ingest_and_export(config_path)
-    merge_counts(config_path)
+    cfg = config_path
+    if yaml is not None:
+        # parse pipeline.yaml once; every step accepts the parsed dict too
+        with open(config_path, "r", encoding="utf-8") as fh:
+            cfg = yaml.load(fh, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader)) or {}
+    extract_dnsdb(cfg)
+    enrich_pairs(cfg)
+    # Steps 3-4 and the feed ingestion of Step 5 are independent: run the
+    # capacity branch in a separate process; Step 5 waits for it only to
+    # export, and Step 6 runs once both are done:
+    #   extract -> enrich -> [slds -> capacity] + [ingest] -> export -> merge
+    capacity = _CapacityBranch(cfg)
+    try:
+        ingest_and_export(cfg, capacity_ready=capacity)
+    finally:
+        capacity.join()  # never leave the branch running behind an error
+    merge_counts(cfg)
     print("[✓] Pipeline completed.")